@@ -3,15 +3,27 @@ import ollama
 from sentence_transformers import SentenceTransformer
 import faiss
 from pymongo import MongoClient
+import logging
 import os
 import re
 import datetime
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import pymssql
 import plotly.express as px
 
+from facts import rag_facts
+from index_registry import IndexRegistry, INDEX_FILENAME
+from semantic_cache import SemanticCache
+from session_store import SessionStore, valid_session_id
+
+log = logging.getLogger(__name__)
+
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 INDEX_PATH = os.path.join(DATA_DIR, "index.faiss")
+TENANTS_DIR = os.environ.get("RAG_TENANTS_DIR", os.path.join(DATA_DIR, "tenants"))
+SESSION_DB = os.environ.get("RAG_SESSION_DB", os.path.join(DATA_DIR, "sessions.sqlite3"))
 
 MODEL_NAME = os.environ.get("OLLAMA_MODEL", "llama3")
 EMBEDDER_MODEL = os.environ.get("EMBEDDER_MODEL", "all-MiniLM-L6-v2")
@@ -24,6 +36,14 @@ TOP_K = int(os.environ.get("RAG_TOP_K", "3"))
 CHUNK_CHAR_LIMIT = int(os.environ.get("RAG_CHUNK_CHAR_LIMIT", "700"))
 STRICT_REFUSAL_THRESHOLD = float(os.environ.get("RAG_STRICT_THRESHOLD", "0.35"))  # cosine/IP score
 SAFE_MODE = os.environ.get("RAG_SAFE_MODE", "strict").lower()  # "strict" or "soft"
+SHARD_MEMORY_MB = int(os.environ.get("RAG_SHARD_MEMORY_MB", "512"))  # budget for per-ULB shards
+CACHE_SIZE = int(os.environ.get("RAG_CACHE_SIZE", "256"))  # 0 disables the semantic answer cache
+CACHE_THRESHOLD = float(os.environ.get("RAG_CACHE_THRESHOLD", "0.92"))  # query-to-query cosine
+HISTORY_TURNS = 3  # recent turns always sent verbatim; older ones are folded into the session digest
+SUMMARY_BATCH = 10  # max turns folded per summary call; prompts carry at most HISTORY_TURNS + SUMMARY_BATCH turns
+SESSION_TTL_DAYS = float(os.environ.get("RAG_SESSION_TTL_DAYS", "30"))  # 0 keeps sessions forever
+DIGEST_CHAR_LIMIT = int(os.environ.get("RAG_DIGEST_CHAR_LIMIT", "600"))
+HISTORY_PAGE_SIZE = int(os.environ.get("RAG_HISTORY_PAGE_SIZE", "10"))
 
 # SQL DB (for vehicle report tab)
 DB_SERVER = os.environ.get("DB_SERVER", "")
@@ -32,37 +52,124 @@ DB_USER = os.environ.get("DB_USER", "")
 DB_PASS = os.environ.get("DB_PASS", "")
 
 # load once (RAG resources)
-index = faiss.read_index(INDEX_PATH)
 embedder = SentenceTransformer(EMBEDDER_MODEL)
-mongo = MongoClient(MONGO_URI)[DB][COLL]
+mongo_client = MongoClient(MONGO_URI)
+mongo = mongo_client[DB][COLL]
+
+@st.cache_resource
+def get_sessions():
+    """Chat sessions, persisted across reconnects; one SQLite connection per process."""
+    return SessionStore(SESSION_DB)
+
+
+@st.cache_resource
+def get_summary_pool():
+    """The single background worker that builds session digests off the request path."""
+    return ThreadPoolExecutor(max_workers=1)
+
+
+sessions = get_sessions()
+summary_pool = get_summary_pool()
+
+
+def tenant_docs(tenant):
+    """Mongo collection holding one ULB's chunks."""
+    return mongo_client[DB][f"{COLL}_{tenant}"]
+
+
+def load_tenant_shard(tenant):
+    """Load one ULB's FAISS shard; its chunks live in tenant_docs(tenant)."""
+    return faiss.read_index(os.path.join(TENANTS_DIR, tenant, INDEX_FILENAME))
+
+
+@st.cache_resource
+def get_answer_cache():
+    """Answers to earlier, semantically equivalent questions over the same chunks.
+
+    Shared across Streamlit reruns and sessions, like the registry.
+    """
+    return SemanticCache(max_entries=CACHE_SIZE, threshold=CACHE_THRESHOLD)
+
+
+@st.cache_resource
+def get_registry():
+    """Per-ULB shards, loaded lazily on first query for that ULB.
+
+    Cached across Streamlit reruns and sessions, so loaded shards and the LRU
+    memory budget are shared by every query in the process. Answers built from
+    a shard are dropped when its index file changes on disk.
+    """
+    return IndexRegistry(
+        TENANTS_DIR, SHARD_MEMORY_MB * 1024 * 1024, load_tenant_shard,
+        on_reload=get_answer_cache().invalidate,
+    )
+
+
+@st.cache_resource(max_entries=1)
+def load_default_index(mtime):
+    """Read the default index; keyed on its mtime, so a rebuilt file is picked up."""
+    # new index contents: answers cached from the old one may be wrong now
+    get_answer_cache().invalidate()
+    return faiss.read_index(INDEX_PATH)
+
+
+index = load_default_index(os.path.getmtime(INDEX_PATH))
+
+
+def reload_indexes():
+    """Re-read the default index from disk and drop loaded shards and cached answers."""
+    global index
+    load_default_index.clear()
+    index = load_default_index(os.path.getmtime(INDEX_PATH))
+    get_registry().clear()
+    get_answer_cache().invalidate()
+
+
+def embed_query(q):
+    """L2-normalized 1xD float32 embedding of a query."""
+    emb = embedder.encode([q], convert_to_numpy=True).astype("float32")
+    faiss.normalize_L2(emb)
+    return emb
 
 
-def retrieve(q, k=3):
+def retrieve(q, k=3, tenants=None, emb=None):
     """Retrieve top-k chunks with scores from FAISS+Mongo.
 
+    tenants: optional list of ULB names; searches their shards (in parallel if
+    more than one) instead of the default single index.
+    emb: optional precomputed embed_query(q).
+
     Returns a list of dicts: {"text": str, "score": float} sorted by relevance.
     """
     q = (q or "").strip()
     if not q:
         return []
 
-    emb = embedder.encode([q], convert_to_numpy=True).astype("float32")
-    faiss.normalize_L2(emb)
-    D, I = index.search(emb, k)
+    if emb is None:
+        emb = embed_query(q)
 
-    ids = [int(x) for x in I[0] if int(x) >= 0]
-    if not ids:
+    if tenants:
+        hits = get_registry().search_many(tenants, emb, k)
+    else:
+        D, I = index.search(emb, k)
+        hits = [(float(score), None, int(idx)) for idx, score in zip(I[0], D[0]) if int(idx) >= 0]
+    if not hits:
         return []
 
-    docs = list(mongo.find({"faiss_idx": {"$in": ids}}))
-    docs_map = {int(d["faiss_idx"]): d for d in docs}
+    ids_by_tenant = {}
+    for _, tenant, idx in hits:
+        ids_by_tenant.setdefault(tenant, []).append(idx)
+
+    docs_map = {}
+    for tenant, ids in ids_by_tenant.items():
+        # a plain handle; going through the registry could reload an evicted shard
+        coll = mongo if tenant is None else tenant_docs(tenant)
+        for d in coll.find({"faiss_idx": {"$in": ids}}):
+            docs_map[(tenant, int(d["faiss_idx"]))] = d
 
     results = []
-    for idx, score in zip(I[0], D[0]):
-        idx = int(idx)
-        if idx < 0:
-            continue
-        d = docs_map.get(idx)
+    for score, tenant, idx in hits:
+        d = docs_map.get((tenant, idx))
         if not d:
             continue
         txt = (d.get("text") or "").strip()
@@ -75,6 +182,7 @@ def retrieve(q, k=3):
             "text": txt,
             "score": float(score),
             "faiss_idx": idx,
+            "tenant": tenant,
         })
     return results
 
@@ -92,6 +200,79 @@ def normalize_vehicle(v: str) -> str:
     return v
 
 
+# e.g. MH08AP1894, MH08-AP-1894, mh 08 ap 1894
+VEHICLE_RE = re.compile(r"\b[A-Za-z]{2}[\s\-]?\d{1,2}[\s\-]?[A-Za-z]{0,3}[\s\-]?\d{4}\b")
+# 2024-06-05, 2024/6/5, and day-first 05-06-2024 (as in the attendance exports)
+DATE_RE = re.compile(
+    r"\b(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})\b|\b(\d{1,2})[-/.](\d{1,2})[-/.](\d{4})\b"
+)
+RELATIVE_DAY_RE = re.compile(
+    r"\b(day before yesterday|yesterday|today|tomorrow|tonight|(?:this|last|next|previous) "
+    r"(?:week|month|year)|monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b",
+    re.IGNORECASE,
+)
+MONTH_RE = re.compile(
+    r"\b(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\b", re.IGNORECASE
+)
+NUMBER_RE = re.compile(r"\d+")
+# What a question asks about. Questions for the same vehicle and day retrieve the
+# same fact chunk, so "first" vs "last scan" must not rest on embedding similarity.
+ATTRIBUTE_RES = [
+    ("houses", re.compile(r"\b(?:house(?:hold)?s?|homes?)\b", re.IGNORECASE)),
+    ("dump", re.compile(r"\b(?:dump\w*|trips?)\b", re.IGNORECASE)),
+    ("duty_on", re.compile(r"\b(?:duty[\s\-]?(?:on|start\w*|in)|on[\s\-]duty|check(?:ed)?[\s\-]?in)\b", re.IGNORECASE)),
+    ("duty_off", re.compile(r"\b(?:duty[\s\-]?(?:off|end\w*|out)|off[\s\-]duty|check(?:ed)?[\s\-]?out)\b", re.IGNORECASE)),
+    ("duty", re.compile(r"\b(?:duty|shift)\b", re.IGNORECASE)),
+    ("first", re.compile(r"\b(?:first|earliest)\b", re.IGNORECASE)),
+    ("last", re.compile(r"\b(?:last|latest|final)\b", re.IGNORECASE)),
+    ("scan", re.compile(r"\bscan\w*\b", re.IGNORECASE)),
+]
+
+CacheKey = namedtuple(
+    "CacheKey", ["vehicles", "dates", "relative", "day", "months", "numbers", "attributes", "tenants"]
+)
+
+
+def query_cache_key(q, tenants=None, today=None):
+    """Canonical part of a question that must match exactly for a cached answer to be reused.
+
+    Covers vehicles, dates, relative days (resolved against today), month names,
+    any other numbers, what is asked for (houses, dump trips, first/last scan,
+    duty on/off) and the ULBs searched.
+    """
+    text = q or ""
+    vehicles = sorted({normalize_vehicle(m) for m in VEHICLE_RE.findall(text)})
+    text = VEHICLE_RE.sub(" ", text)
+
+    dates = set()
+    for y1, m1, d1, d2, m2, y2 in DATE_RE.findall(text):
+        y, m, d = (y1, m1, d1) if y1 else (y2, m2, d2)
+        dates.add(f"{int(y):04d}-{int(m):02d}-{int(d):02d}")
+    text = DATE_RE.sub(" ", text)
+
+    relative = sorted({" ".join(m.lower().split()) for m in RELATIVE_DAY_RE.findall(text)})
+    text = RELATIVE_DAY_RE.sub(" ", text)
+    months = sorted({m.lower() for m in MONTH_RE.findall(text)})
+    numbers = sorted({int(n) for n in NUMBER_RE.findall(text)})
+    attributes = []
+    for name, pattern in ATTRIBUTE_RES:
+        if pattern.search(text):
+            attributes.append(name)
+            text = pattern.sub(" ", text)  # "duty on" is not also plain "duty"
+
+    # "yesterday" asked on different days means different days
+    day = (today or datetime.date.today()).isoformat() if relative else ""
+    return CacheKey(
+        tuple(vehicles), tuple(sorted(dates)), tuple(relative), day,
+        tuple(months), tuple(numbers), tuple(attributes), tuple(tenants or ()),
+    )
+
+
+def is_self_contained(key):
+    """True if the question names a vehicle and a day, so earlier turns can't change its meaning."""
+    return bool(key.vehicles and (key.dates or key.relative or key.months))
+
+
 SQL = r"""
 WITH vqr AS (
     SELECT vqrId, VehicalNumber
@@ -184,30 +365,32 @@ def get_vehicle_daily_stats(vehicle_number, from_date, to_date, zone_id=0, panel
     return df
 
 
-def row_to_rag_fact(row):
-    parts = []
-    parts.append(f"On {row['Date']} vehicle {row['VehicleNumber']}")
-    if row.get("TotalHouseCount", None) is not None:
-        parts.append(f"scanned {int(row['TotalHouseCount'])} houses")
-    if row.get("TotalDumpTrip", None) is not None:
-        parts.append(f"and did {int(row['TotalDumpTrip'])} dump trips")
-    if row.get("FirstHouseScan", None):
-        parts.append(f"first scan at {row['FirstHouseScan']}")
-    if row.get("LastHouseScan", None):
-        parts.append(f"last scan at {row['LastHouseScan']}")
-    if row.get("DutyOnTime", None) and row.get("DutyOffTime", None):
-        parts.append(f"duty {row['DutyOnTime']} - {row['DutyOffTime']}")
-    return ". ".join(parts) + "."
+# streamlit run app.py --server.port 7860
 
+def summarize_turns(old_digest, turns):
+    """Fold turns into a short running summary of the conversation (used by SessionStore)."""
+    convo = "\n\n".join(f"User: {u}\nAssistant: {a}" for u, a in turns)
+    prompt = (
+        "Update the summary of a conversation between a user and a company data assistant. "
+        f"Keep only facts, vehicles, dates and open questions. At most {DIGEST_CHAR_LIMIT} characters, "
+        "plain text, no preamble.\n\n"
+        f"CURRENT SUMMARY:\n{old_digest or '(empty)'}\n\nNEW TURNS:\n{convo}\n\nUPDATED SUMMARY:"
+    )
+    r = ollama.chat(model=MODEL_NAME, messages=[{"role": "user", "content": prompt}])
+    return r["message"]["content"]
 
-# streamlit run app.py --server.port 7860
 
-def rag(q, history=None):
+def rag(q, history=None, tenants=None, digest=None):
     """RAG answer with strict refusals and a human, but grounded, tone.
 
-    history: optional list of (user, assistant) turns to give the LLM more context.
+    history: optional list of (user, assistant) turns to include verbatim; the chat
+        tab passes every turn not yet folded into the digest.
+    tenants: optional list of ULB names to answer from (see retrieve).
+    digest: optional summary of older turns; capped at DIGEST_CHAR_LIMIT.
     """
-    ctx = retrieve(q, k=TOP_K)
+    q = (q or "").strip()
+    emb = embed_query(q) if q else None
+    ctx = retrieve(q, k=TOP_K, tenants=tenants, emb=emb)
 
     # If nothing relevant is retrieved, decide based on SAFE_MODE.
     if not ctx:
@@ -222,14 +405,26 @@ def rag(q, history=None):
             return IDK_MESSAGE + " The data I found is not strong enough to answer confidently.", ctx
         return IDK_MESSAGE, ctx
 
+    # The prompt also carries the conversation. A question that names its vehicle
+    # and day means the same in any conversation; others ("and the day before?")
+    # only reuse answers given without one.
+    answer_cache = get_answer_cache()
+    cache_key = query_cache_key(q, tenants)
+    use_cache = is_self_contained(cache_key) or (not history and not digest)
+    chunk_ids = [(c.get("tenant"), c.get("faiss_idx")) for c in ctx]
+    if use_cache:
+        cached = answer_cache.lookup(emb, cache_key, chunk_ids)
+        if cached is not None:
+            return cached, ctx
+    else:
+        answer_cache.skip()
+
     ctx_text = "\n\n".join(c["text"] for c in ctx)
 
     history_text = ""
     if history:
-        # Keep only last few turns to keep prompt small
-        recent = history[-3:]
         parts = []
-        for u, a in recent:
+        for u, a in history:
             parts.append(f"User: {u}\nAssistant: {a}")
         history_text = "\n\n".join(parts)
 
@@ -244,13 +439,47 @@ def rag(q, history=None):
         "Avoid raw JSON or overly technical formatting unless the user explicitly asks for it.\n\n"
     )
 
+    if digest:
+        prompt += (
+            "Summary of earlier conversation (for context, do not invent new facts):\n"
+            + digest[:DIGEST_CHAR_LIMIT] + "\n\n"
+        )
+
     if history_text:
         prompt += "Recent conversation (for context, do not invent new facts):\n" + history_text + "\n\n"
 
     prompt += f"CONTEXT:\n{ctx_text}\n\nQUESTION: {q}\nNow give your answer following the rules above."
 
     r = ollama.chat(model=MODEL_NAME, messages=[{"role": "user", "content": prompt}])
-    return r["message"]["content"], ctx
+    answer = r["message"]["content"]
+    if use_cache:
+        answer_cache.store(emb, cache_key, chunk_ids, answer)
+    return answer, ctx
+
+
+def log_background_failure(future):
+    """Done-callback for summary_pool work, whose results nobody waits for."""
+    e = future.exception()
+    if e is not None:
+        log.error("Background session task failed", exc_info=e)
+
+
+def chat_turn(sid, q, tenants=None):
+    """Answer q within chat session sid, record the turn and fold older turns in the background."""
+    # the digest plus the turns it doesn't cover yet make up the whole conversation
+    # (capped, in case summaries are failing)
+    digest, history = sessions.context(sid, max_turns=HISTORY_TURNS + SUMMARY_BATCH)
+    answer, ctx = rag(q, history=history, tenants=tenants, digest=digest)
+    sessions.append_turn(sid, q, answer)
+    summary_pool.submit(
+        sessions.summarize, sid, summarize_turns,
+        keep_recent=HISTORY_TURNS, max_batch=SUMMARY_BATCH, char_limit=DIGEST_CHAR_LIMIT,
+    ).add_done_callback(log_background_failure)
+    if SESSION_TTL_DAYS > 0:
+        summary_pool.submit(
+            sessions.expire, SESSION_TTL_DAYS * 86400, every=3600,
+        ).add_done_callback(log_background_failure)
+    return answer, ctx
 
 st.set_page_config(page_title="Trashbot", layout="wide")
 
@@ -289,8 +518,42 @@ with chat_tab:
         st.text(f"Strict threshold: {STRICT_REFUSAL_THRESHOLD}")
         st.text(f"Safe mode: {SAFE_MODE}")
 
-    if "chat_history" not in st.session_state:
-        st.session_state.chat_history = []  # list of (user, assistant)
+        st.markdown("### Data source (ULB)")
+        registry = get_registry()
+        ulb_options = ["Default index"] + registry.tenants()
+        if len(ulb_options) > 2:
+            ulb_options.append("All ULBs")
+        ulb_choice = st.selectbox("Answer from", ulb_options, key="chat_ulb")
+        st.caption(
+            f"Loaded shards: {len(registry.loaded())} "
+            f"({registry.loaded_bytes() / (1024 * 1024):.1f} / {SHARD_MEMORY_MB} MB)"
+        )
+
+        st.markdown("### Answer cache")
+        cache_stats = get_answer_cache().stats()
+        st.text(f"Entries: {cache_stats['entries']} / {CACHE_SIZE}")
+        st.text(
+            f"Hit rate: {cache_stats['hit_rate']:.0%} ({cache_stats['hits']} hits, "
+            f"{cache_stats['misses']} misses, {cache_stats['skipped']} not cacheable)"
+        )
+        st.text(f"Evictions: {cache_stats['evictions']}")
+        if st.button("Reload index", key="reload_index"):
+            reload_indexes()
+            st.rerun()
+
+    if ulb_choice == "Default index":
+        chat_tenants = None
+    elif ulb_choice == "All ULBs":
+        chat_tenants = registry.tenants()
+    else:
+        chat_tenants = [ulb_choice]
+
+    # The session id lives in the URL, so a reconnect picks the same conversation up again.
+    # Nothing is stored until the first question.
+    sid = st.query_params.get("sid")
+    if not valid_session_id(sid):
+        sid = sessions.new_session()
+        st.query_params["sid"] = sid
 
     col_q1, col_q2 = st.columns([4, 1])
     with col_q1:
@@ -299,33 +562,42 @@ with chat_tab:
         clear = st.button("Clear chat", key="chat_clear")
 
     if clear:
-        st.session_state.chat_history = []
+        sessions.clear(sid)
+        st.session_state.chat_page = 1
         st.rerun()
 
     if st.button("Send", key="chat_send") and query:
         with st.spinner("Thinking based on your company data..."):
-            answer, ctx = rag(query, history=st.session_state.chat_history)
-        st.session_state.chat_history.append((query, answer))
+            answer, ctx = chat_turn(sid, query, tenants=chat_tenants)
 
         # Show latest context snippets in an expander
         with st.expander("Show retrieved context for this answer", expanded=False):
             for i, c in enumerate(ctx, start=1):
-                st.markdown(f"**Chunk {i} (score={c['score']:.3f}, idx={c['faiss_idx']}):**")
+                source = f", ulb={c['tenant']}" if c.get("tenant") else ""
+                st.markdown(f"**Chunk {i} (score={c['score']:.3f}, idx={c['faiss_idx']}{source}):**")
                 st.write(c["text"])
 
-    # Display chat history
-    if st.session_state.chat_history:
+    # Display chat history, one page at a time
+    n_turns = sessions.count_turns(sid)
+    if n_turns:
         st.markdown("---")
         st.markdown("**Conversation history**")
-        for user_msg, bot_msg in st.session_state.chat_history:
+        n_pages = (n_turns + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE
+        page = 1
+        if n_pages > 1:
+            page = int(st.number_input(
+                f"Page (1 = newest, {n_pages} pages)", min_value=1, max_value=n_pages, value=1, step=1,
+                key="chat_page",
+            ))
+        for _, user_msg, bot_msg in sessions.page(sid, page - 1, HISTORY_PAGE_SIZE):
             st.markdown(f"**You:** {user_msg}")
             st.markdown(f"**Trashbot:** {bot_msg}")
             st.markdown("<hr style='margin:4px 0' />", unsafe_allow_html=True)
 
-    # Export chat transcript
-    if st.session_state.chat_history:
+    # Export chat transcript (built on request, not on every rerun)
+    if n_turns and st.button("Prepare chat transcript", key="chat_transcript"):
         transcript_lines = []
-        for u, a in st.session_state.chat_history:
+        for _, u, a in sessions.iter_turns(sid):
             transcript_lines.append(f"User: {u}\nAssistant: {a}\n")
         st.download_button(
             "Download chat transcript",
@@ -403,8 +675,7 @@ with report_tab:
                     )
                     st.plotly_chart(fig, use_container_width=True)
 
-                rag_texts = [row_to_rag_fact(r) for _, r in df.iterrows()]
-                rag_blob = "\n".join(rag_texts)
+                rag_blob = "\n".join(rag_facts(df))
                 st.download_button(
                     "Download facts for RAG (txt)",
                     data=rag_blob,
@@ -0,0 +1,76 @@
+"""Benchmark rag_facts() against the per-row row_to_rag_fact() export.
+
+Usage:
+  python benchmarks/bench_facts.py              # 1M rows
+  python benchmarks/bench_facts.py --rows 100000
+
+Builds a synthetic vehicle report (with nulls in the optional columns), renders
+it both ways, checks the two outputs are byte-identical and prints the timings.
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from facts import rag_facts, row_to_rag_fact  # noqa: E402
+
+
+def synthetic_report(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    start = datetime.date(2024, 1, 1)
+    days = rng.integers(0, 365, rows)
+    minutes = rng.integers(6 * 60, 14 * 60, rows)
+
+    def times(offset, null_every):
+        out = [datetime.time((m + offset) // 60 % 24, (m + offset) % 60) for m in minutes]
+        for i in range(0, rows, null_every):
+            out[i] = None
+        return out
+
+    return pd.DataFrame(
+        {
+            "Date": [start + datetime.timedelta(days=int(d)) for d in days],
+            "VehicleNumber": [f"MH08AP{n:04d}" for n in rng.integers(0, 2000, rows)],
+            "FirstHouseScan": times(5, 17),
+            "LastHouseScan": times(300, 19),
+            "TotalHouseCount": rng.integers(0, 600, rows),
+            "LastDumpScan": times(320, 23),
+            "TotalDumpTrip": rng.integers(0, 4, rows),
+            "DutyOnTime": times(0, 29),
+            "DutyOffTime": times(480, 31),
+        }
+    )
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--rows", type=int, default=1_000_000)
+    args = p.parse_args()
+
+    df = synthetic_report(args.rows)
+    print(f"{len(df):,} rows")
+
+    t0 = time.perf_counter()
+    baseline = "\n".join(row_to_rag_fact(r) for _, r in df.iterrows())
+    t_rows = time.perf_counter() - t0
+    print(f"row_to_rag_fact + iterrows: {t_rows:8.2f} s")
+
+    t0 = time.perf_counter()
+    vectorized = "\n".join(rag_facts(df))
+    t_cols = time.perf_counter() - t0
+    print(f"rag_facts (column-wise):    {t_cols:8.2f} s")
+
+    identical = baseline.encode() == vectorized.encode()
+    print(f"speedup: {t_rows / t_cols:.1f}x, byte-identical: {identical}")
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,21 @@
 Usage examples:
   python build_index.py --csv example.csv --text-column text
   python build_index.py --sql "SELECT id, text FROM docs" --conn "DRIVER={SQL Server};SERVER=.;DATABASE=db;UID=user;PWD=pwd"
+  python build_index.py --csv ulhasnagar.csv --tenant UlhasNagarMahanagarPalika
+  python build_index.py --facts vehicle_report.parquet
+
+--facts takes a vehicle report export (.parquet or .csv with the app's report
+columns: Date, VehicleNumber, TotalHouseCount, ...). It renders the rows as RAG
+facts and streams them into the encoder batch by batch. The export is never
+loaded whole.
 
 This script writes:
   - data/index.faiss (FAISS index)
   - data/metadata.parquet (ids, texts)
 
+With --tenant, both files go to data/tenants/<tenant>/ instead, as a per-ULB
+shard for the app's index registry.
+
 It uses sentence-transformers 'all-MiniLM-L6-v2' for embeddings.
 """
 import argparse
@@ -33,22 +43,31 @@ def chunk_text(text, max_tokens=500, sep='\n'):
     return chunks
 
 
+def _col(df, name):
+    # str() of each value, as an f-string over iterrows would render it
+    return pd.Series([str(v) for v in df[name].to_numpy(dtype=object)], index=df.index, dtype=object)
+
+
+def chunk_frame(texts):
+    """Chunk a Series of texts into an id/text DataFrame (ids are "<row>-<chunk>")."""
+    chunks = texts.map(chunk_text).explode().dropna()
+    n = chunks.groupby(level=0).cumcount()
+    ids = chunks.index.map(str) + "-" + n.astype(str).to_numpy()
+    return pd.DataFrame({'id': list(ids), 'text': chunks.tolist()})
+
+
 def load_data_from_csv(path, text_column=None):
     df = pd.read_csv(path)
-    out = []
-    for idx, row in df.iterrows():
-        # Create a text summary from multiple columns
-        txt = f"Date: {row['Date']}\nEmployee: {row['EmployeeName']} (ID: {row['emp_id']})\n"
-        txt += f"Vehicle: {row['vehicleNumber']}\nTarget: {row['Target']}\n"
-        txt += f"Waste Collection: Mixed={row['mixed_waste']}, Segregated={row['segregate_waste']}\n"
-        txt += f"Houses: Total={row['TotalHouseCount']}, Not Collected={row['Not_collected']}\n"
-        txt += f"Duty: {row['duty_on_time']} to {row['duty_off_time']} ({row['working_time']})\n"
-        txt += f"First Scan: {row['FirstHouseScan']}, Last Scan: {row['LastHouseScan']}"
-        
-        chunks = chunk_text(txt)
-        for i, c in enumerate(chunks):
-            out.append({'id': f"{idx}-{i}", 'text': c})
-    return pd.DataFrame(out)
+    if df.empty:
+        return pd.DataFrame(columns=['id', 'text'])
+    # Create a text summary from multiple columns (built column-wise, not per row)
+    txt = "Date: " + _col(df, 'Date') + "\nEmployee: " + _col(df, 'EmployeeName') + " (ID: " + _col(df, 'emp_id') + ")\n"
+    txt += "Vehicle: " + _col(df, 'vehicleNumber') + "\nTarget: " + _col(df, 'Target') + "\n"
+    txt += "Waste Collection: Mixed=" + _col(df, 'mixed_waste') + ", Segregated=" + _col(df, 'segregate_waste') + "\n"
+    txt += "Houses: Total=" + _col(df, 'TotalHouseCount') + ", Not Collected=" + _col(df, 'Not_collected') + "\n"
+    txt += "Duty: " + _col(df, 'duty_on_time') + " to " + _col(df, 'duty_off_time') + " (" + _col(df, 'working_time') + ")\n"
+    txt += "First Scan: " + _col(df, 'FirstHouseScan') + ", Last Scan: " + _col(df, 'LastHouseScan')
+    return chunk_frame(txt)
 
 
 def load_data_from_sql(sql, conn_str, text_column='text', id_column='id'):
@@ -66,32 +85,70 @@ def load_data_from_sql(sql, conn_str, text_column='text', id_column='id'):
     return pd.DataFrame(out)
 
 
-def build_index(df, model_name='all-MiniLM-L6-v2', out_dir='data', dim=384):
+def iter_fact_input(path, batch_size=100_000):
+    """Yield (ids, texts) fact batches from a report export, reading it batch by batch."""
+    from facts import rag_facts
+
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        frames = (b.to_pandas() for b in pq.ParquetFile(path).iter_batches(batch_size=batch_size))
+    else:
+        frames = pd.read_csv(path, chunksize=batch_size)
+
+    offset = 0
+    for frame in frames:
+        texts = rag_facts(frame)
+        yield [f"{offset + i}-0" for i in range(len(texts))], texts
+        offset += len(frame)
+
+
+def build_index_batches(batches, model_name='all-MiniLM-L6-v2', out_dir='data'):
+    """Encode (ids, texts) batches one at a time into index.faiss and metadata.parquet."""
     from sentence_transformers import SentenceTransformer
     import faiss
+    import pyarrow as pa
+    import pyarrow.parquet as pq
 
     os.makedirs(out_dir, exist_ok=True)
-    texts = df['text'].tolist()
-    ids = df['id'].tolist()
+    index_path = os.path.join(out_dir, 'index.faiss')
+    meta_path = os.path.join(out_dir, 'metadata.parquet')
 
-    print(f"Encoding {len(texts)} text chunks with {model_name}...")
     model = SentenceTransformer(model_name)
-    embeddings = model.encode(texts, show_progress_bar=True, convert_to_numpy=True)
-    embeddings = embeddings.astype('float32')
-
-    # normalize for IP/ cosine
-    faiss.normalize_L2(embeddings)
+    index = None
+    writer = None
+    try:
+        for ids, texts in batches:
+            if not texts:
+                continue
+            print(f"Encoding {len(texts)} text chunks with {model_name}...")
+            embeddings = model.encode(texts, show_progress_bar=True, convert_to_numpy=True)
+            embeddings = embeddings.astype('float32')
+
+            # normalize for IP/ cosine
+            faiss.normalize_L2(embeddings)
+
+            if index is None:
+                index = faiss.IndexFlatIP(embeddings.shape[1])
+            index.add(embeddings)
+
+            table = pa.table({'id': [str(i) for i in ids], 'text': texts})
+            if writer is None:
+                writer = pq.ParquetWriter(meta_path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if index is None:
+        print('No text chunks to index')
+        return
 
-    index = faiss.IndexFlatIP(embeddings.shape[1])
-    index.add(embeddings)
-
-    index_path = os.path.join(out_dir, 'index.faiss')
     faiss.write_index(index, index_path)
+    print(f"Wrote index ({index.ntotal} vectors) to {index_path} and metadata to {meta_path}")
 
-    meta_path = os.path.join(out_dir, 'metadata.parquet')
-    df[['id','text']].to_parquet(meta_path, index=False)
 
-    print(f"Wrote index to {index_path} and metadata to {meta_path}")
+def build_index(df, model_name='all-MiniLM-L6-v2', out_dir='data', dim=384):
+    build_index_batches([(df['id'].tolist(), df['text'].tolist())], model_name=model_name, out_dir=out_dir)
 
 
 def main():
@@ -100,19 +157,30 @@ def main():
     p.add_argument('--text-column', default='text', help='Text column name in CSV')
     p.add_argument('--sql', help='SQL query to run via pyodbc')
     p.add_argument('--conn', help='pyodbc connection string')
+    p.add_argument('--facts', help='Vehicle report export (.parquet/.csv) to index as RAG facts, streamed')
     p.add_argument('--out', default='data', help='Output directory')
+    p.add_argument('--tenant', help='ULB name; writes a per-tenant shard under <out>/tenants/<tenant>')
     args = p.parse_args()
 
-    if not args.csv and not (args.sql and args.conn):
-        print('Provide --csv or both --sql and --conn')
+    if not args.csv and not args.facts and not (args.sql and args.conn):
+        print('Provide --csv, --facts or both --sql and --conn')
         sys.exit(1)
 
+    out_dir = args.out
+    if args.tenant:
+        from index_registry import validate_tenant
+        out_dir = os.path.join(args.out, 'tenants', validate_tenant(args.tenant))
+
+    if args.facts:
+        build_index_batches(iter_fact_input(args.facts), out_dir=out_dir)
+        return
+
     if args.csv:
         df = load_data_from_csv(args.csv, args.text_column)
     else:
         df = load_data_from_sql(args.sql, args.conn)
 
-    build_index(df, out_dir=args.out)
+    build_index(df, out_dir=out_dir)
 
 
 if __name__ == '__main__':
@@ -1,76 +1,49 @@
 # Run python3 database.py  --server 183.177.126.159 --database LIVEAdvanceWarudGhantaGadi --ulbname UlhasNagarMahanagarPalika --hostname localhost --filename VehicleWiseDutyReport --ReportTitle "VehicleWiseDutyReport" --FromDate '2024-06-01' --ToDate '2024-07-05' --VehicleQR 26 --ZoneId 0 --PanelId 0
+#
+# Batch mode (one manifest row per ULB/vehicle/date-range job):
+# Run python3 database.py --manifest jobs.csv --out reports --workers 4
+#
+# Manifest columns: server, database, ulbname, VehicleQR, FromDate, ToDate
+# (optional: ZoneId, PanelId, ReportTitle). Each job writes
+# <out>/<ulbname>/<VehicleQR>_<FromDate>_<ToDate>_z<ZoneId>_p<PanelId>.parquet
+# and .html, and the run writes <out>/run_summary.csv with per-job status, row
+# count and timing (wait_seconds: queued for a connection, seconds: query and
+# output). Manifests with two jobs for the same output are rejected.
+#
+# DB credentials come from the DB_USER / DB_PASS environment variables.
 
 import numpy as np
 import pandas as pd
 import warnings
 import argparse
+import contextlib
 import os
+import queue
+import sys
+import threading
+import time
 warnings.filterwarnings("ignore")
-import pymssql
-import plotly.graph_objs as go
 import datetime
-# construct the argument parser and parse the arguments
-ap = argparse.ArgumentParser()
-ap.add_argument("-ip", "--server", required=True, help="Server IP address")
-ap.add_argument("-db", "--database", required=True, help="Database name")
-ap.add_argument("-ulbname", "--ulbname", required=True, help="name of the ULB")
-ap.add_argument("-hostname", "--hostname", required=True, help="name of the ULB")
-ap.add_argument("-filename", "--filename", required=True, help="name of the File")
-ap.add_argument("-ReportTitle", "--ReportTitle", required=True, help="name of the ULB")
-ap.add_argument("-FromDate", "--FromDate", required=True, help="Starting Date")
-ap.add_argument("-ToDate", "--ToDate", required=True, help="Ending Date")
-ap.add_argument("-VehicleQR", "--VehicleQR", required=True, help="Vehicle QR ID")
-ap.add_argument("-ZoneId", "--ZoneId", required=True, help="ZoneId")
-ap.add_argument("-PanelId", "--PanelId", required=True, help="PanelId")
-args = vars(ap.parse_args())
-
-# HostName
-hostname = args["hostname"]
-# Directory
-directory = args["ulbname"]
-# Filename
-filename = args["filename"]
-# Report Title
-reporttitle = args["ReportTitle"]
-# Starting Date
-starting_date = args["FromDate"]
-# ending_date
-ending_date = args["ToDate"]
-# Vehicle Qr ID
-qr_id = args["VehicleQR"]
-
-if hostname == "localhost":
-
-    # Parent Directory path
-    parent_dir = "D:/Ulhasnagar_ICTSBMCMS_28-08-2025/SwachhBharatAbhiyan.CMS/Images/AI"
-
-else:
-
-    # Parent Directory path
-    parent_dir = "D:/Publish/Ulhasnagar_ICTSBM_CMS/Images/AI"
-
-# Path
-path = os.path.join(parent_dir, directory)
-
-try:
-    os.mkdir(path)
-except OSError as error:
-    print(error)
-
-server = args["server"]
-database = args["database"]
-
-ZoneId = args["ZoneId"]
-PanelId = args["PanelId"]
+from concurrent.futures import ThreadPoolExecutor
+
+from index_registry import validate_tenant
+
+DB_USER = os.environ.get("DB_USER", "")
+DB_PASS = os.environ.get("DB_PASS", "")
+
+MANIFEST_COLUMNS = ["server", "database", "ulbname", "VehicleQR", "FromDate", "ToDate"]
+SUMMARY_COLUMNS = MANIFEST_COLUMNS + ["ZoneId", "PanelId"]
 
 query1 = """ WITH base_attendance AS (
     SELECT cast(DA.daDate as date) AS Date,
            DA.userId,
-           DA.daID
+           DA.daID,
+           DA.startTime,
+           DA.endTime
     FROM Daily_Attendance DA WITH (NOLOCK)
     WHERE DA.EmployeeType IS NULL
-      AND cast(DA.daDate as date) BETWEEN @from AND @to
-      AND DA.userId = @userid
+      AND cast(DA.daDate as date) BETWEEN %(from)s AND %(to)s
+      AND DA.VQRId = %(vqr)s
 ),
 user_name AS (
     SELECT userId, userName FROM UserMaster WITH (NOLOCK)
@@ -78,25 +51,27 @@ user_name AS (
 gc_union AS (
     SELECT gcDate, userId, houseId, gcType, 0 as isNotScan
     FROM GarbageCollectionDetails WITH (NOLOCK)
-    WHERE cast(gcDate as date) BETWEEN @from AND @to
+    WHERE cast(gcDate as date) BETWEEN %(from)s AND %(to)s
 
     UNION ALL
 
     SELECT gcDate, userId, houseId, gcType, 1 as isNotScan
     FROM GarbageCollection_NotScan WITH (NOLOCK)
-    WHERE cast(gcDate as date) BETWEEN @from AND @to
+    WHERE cast(gcDate as date) BETWEEN %(from)s AND %(to)s
 ),
 filtered_gc AS (
     SELECT G.*, hm.ZoneId, wd.PanelId
     FROM gc_union G
     LEFT JOIN HouseMaster hm ON hm.houseId = G.houseId
     LEFT JOIN WardNumber wd ON hm.WardNo = wd.Id
-    WHERE (@ZoneId = 0 OR @ZoneId IS NULL OR hm.ZoneId = @ZoneId)
-      AND (@PanelId = 0 OR @PanelId IS NULL OR wd.PanelId = @PanelId)
+    WHERE (%(zone)s = 0 OR %(zone)s IS NULL OR hm.ZoneId = %(zone)s)
+      AND (%(panel)s = 0 OR %(panel)s IS NULL OR wd.PanelId = %(panel)s)
 )
 SELECT A.Date,
        A.userId AS emp_id,
        U.userName AS EmployeeName,
+       MIN(A.startTime) AS DutyOnTime,
+       MAX(A.endTime) AS DutyOffTime,
        MIN(CASE WHEN gcType = 1 THEN CAST(gcDate AS TIME) END) AS FirstHouseScan,
        MAX(CASE WHEN gcType = 1 THEN CAST(gcDate AS TIME) END) AS LastHouseScan,
        SUM(CASE WHEN gcType = 1 THEN 1 ELSE 0 END) AS TotalHouseCount,
@@ -109,17 +84,251 @@ GROUP BY A.Date, A.userId, U.userName
 ORDER BY A.Date ASC;
 """
 
-def df_server(server, database):
-    conn = pymssql.connect(server=server, user='user',
-                           password='userpaass', database=database)
-    df = pd.read_sql_query(query1,conn)
-    return df
-df_data = df_server(server=server, database=database)   
+
+class ConnectionPool:
+    """A small bounded pool of pymssql connections to one server.
+
+    Connections are shared across that server's databases; each checkout
+    switches to the requested database with USE.
+    """
+
+    def __init__(self, server, user, password, size=4):
+        self.server = server
+        self.user = user
+        self.password = password
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        import pymssql
+        return pymssql.connect(server=self.server, user=self.user, password=self.password)
+
+    @contextlib.contextmanager
+    def connection(self, database):
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            ok = False
+            try:
+                cur = conn.cursor()
+                cur.execute("USE [{}]".format(database.replace("]", "]]")))
+                yield conn
+                ok = True
+            finally:
+                if ok:
+                    self._idle.put(conn)
+                else:
+                    # don't hand a possibly broken connection to the next job
+                    with contextlib.suppress(Exception):
+                        conn.close()
+        finally:
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            with contextlib.suppress(Exception):
+                conn.close()
+
+
+def query_params(job):
+    return {
+        "from": str(job["FromDate"]),
+        "to": str(job["ToDate"]),
+        "vqr": int(job["VehicleQR"]),
+        "zone": int(job.get("ZoneId") or 0),
+        "panel": int(job.get("PanelId") or 0),
+    }
+
+
+def output_stem(job):
+    """Output path (relative to --out, without extension) for one job."""
+    p = query_params(job)
+    for name in ("from", "to"):
+        datetime.date.fromisoformat(p[name])  # dates end up in the file name
+    return os.path.join(
+        validate_tenant(job["ulbname"]),
+        f"{p['vqr']}_{p['from']}_{p['to']}_z{p['zone']}_p{p['panel']}",
+    )
+
+
+def fetch_report(conn, job):
+    return pd.read_sql_query(query1, conn, params=query_params(job))
+
+
+def render_report(df, job):
+    import plotly.graph_objs as go
+
+    title = job.get("ReportTitle") or "VehicleWiseDutyReport"
+    formatted_time = datetime.datetime.now().strftime("%d %b %Y %I:%M %p")
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=df["Date"], y=df["TotalHouseCount"], name="Houses"))
+    fig.add_trace(go.Bar(x=df["Date"], y=df["TotalDumpTrip"], name="Dump trips"))
+    fig.update_layout(
+        title=f"{title} - {job['ulbname']} - Vehicle QR {job['VehicleQR']} "
+              f"({job['FromDate']} to {job['ToDate']}) - generated {formatted_time}",
+        barmode="group",
+    )
+    return fig
+
+
+def load_manifest(path):
+    manifest = pd.read_csv(path, dtype=str).fillna("")
+    missing = [c for c in MANIFEST_COLUMNS if c not in manifest.columns]
+    if missing:
+        raise ValueError(f"Manifest {path} is missing columns: {', '.join(missing)}")
+    jobs = manifest.to_dict("records")
+
+    seen = {}
+    for line, job in enumerate(jobs, start=2):
+        try:
+            stem = output_stem(job)
+        except ValueError as e:
+            raise ValueError(f"Manifest {path} line {line}: {e}") from e
+        if stem in seen:
+            raise ValueError(f"Manifest {path} lines {seen[stem]} and {line} write the same report {stem}")
+        seen[stem] = line
+    return jobs
+
+
+def run_job(pool, job, out_dir):
+    """Run one manifest job; never raises, returns a summary record."""
+    record = {c: job.get(c, "") for c in SUMMARY_COLUMNS}
+    record.update({"status": "ok", "rows": 0, "wait_seconds": 0.0, "seconds": 0.0,
+                   "error": "", "parquet": "", "report": ""})
+    queued = time.perf_counter()
+    start = None
+    try:
+        with pool.connection(job["database"]) as conn:
+            # time spent queueing for a pooled connection is not query cost
+            start = time.perf_counter()
+            df = fetch_report(conn, job)
+
+        stem = os.path.join(out_dir, output_stem(job))
+        os.makedirs(os.path.dirname(stem), exist_ok=True)
+
+        df.to_parquet(stem + ".parquet", index=False)
+        render_report(df, job).write_html(stem + ".html", include_plotlyjs="cdn")
+
+        record.update({"rows": len(df), "parquet": stem + ".parquet", "report": stem + ".html"})
+    except Exception as e:
+        record.update({"status": "failed", "error": f"{type(e).__name__}: {e}"})
+    end = time.perf_counter()
+    if start is None:  # failed before a connection was handed out
+        start = end
+    record["wait_seconds"] = round(start - queued, 3)
+    record["seconds"] = round(end - start, 3)
+    return record
+
+
+def run_batch(manifest_path, out_dir, workers=4, pool_size=4):
+    jobs = load_manifest(manifest_path)
+    pools = {
+        server: ConnectionPool(server, DB_USER, DB_PASS, size=pool_size)
+        for server in sorted({j["server"] for j in jobs})
+    }
+    os.makedirs(out_dir, exist_ok=True)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+            records = list(ex.map(lambda j: run_job(pools[j["server"]], j, out_dir), jobs))
+    finally:
+        for pool in pools.values():
+            pool.close()
+
+    summary = pd.DataFrame(records)
+    summary_path = os.path.join(out_dir, "run_summary.csv")
+    summary.to_csv(summary_path, index=False)
+
+    failed = int((summary["status"] != "ok").sum()) if len(summary) else 0
+    print(f"{len(summary) - failed}/{len(summary)} jobs ok, summary written to {summary_path}")
+    return summary
+
+
+def run_single(args):
+    # HostName
+    hostname = args["hostname"]
+    # Directory
+    directory = args["ulbname"]
+
+    if hostname == "localhost":
+
+        # Parent Directory path
+        parent_dir = "D:/Ulhasnagar_ICTSBMCMS_28-08-2025/SwachhBharatAbhiyan.CMS/Images/AI"
+
+    else:
+
+        # Parent Directory path
+        parent_dir = "D:/Publish/Ulhasnagar_ICTSBM_CMS/Images/AI"
+
+    # Path
+    path = os.path.join(parent_dir, directory)
+
+    try:
+        os.mkdir(path)
+    except OSError as error:
+        print(error)
+
+    pool = ConnectionPool(args["server"], DB_USER, DB_PASS, size=1)
+    try:
+        with pool.connection(args["database"]) as conn:
+            df_data = fetch_report(conn, args)
+    finally:
+        pool.close()
+
+    df2 = df_data[['Date', 'DutyOffTime', 'DutyOnTime']]
+    print(df2[:50])
+    return df_data
+
+
+def parse_args(argv=None):
+    # construct the argument parser and parse the arguments
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-ip", "--server", help="Server IP address")
+    ap.add_argument("-db", "--database", help="Database name")
+    ap.add_argument("-ulbname", "--ulbname", help="name of the ULB")
+    ap.add_argument("-hostname", "--hostname", help="name of the ULB")
+    ap.add_argument("-filename", "--filename", help="name of the File")
+    ap.add_argument("-ReportTitle", "--ReportTitle", help="name of the ULB")
+    ap.add_argument("-FromDate", "--FromDate", help="Starting Date")
+    ap.add_argument("-ToDate", "--ToDate", help="Ending Date")
+    ap.add_argument("-VehicleQR", "--VehicleQR", help="Vehicle QR ID")
+    ap.add_argument("-ZoneId", "--ZoneId", help="ZoneId")
+    ap.add_argument("-PanelId", "--PanelId", help="PanelId")
+    ap.add_argument("--manifest", help="CSV of batch jobs (see header comment)")
+    ap.add_argument("--out", default="reports", help="Batch output directory")
+    ap.add_argument("--workers", type=int, default=4, help="Parallel batch jobs")
+    ap.add_argument("--pool-size", type=int, default=4, help="Max connections per server")
+    args = vars(ap.parse_args(argv))
+
+    if not args["manifest"]:
+        single_required = ["server", "database", "ulbname", "hostname", "filename", "ReportTitle",
+                           "FromDate", "ToDate", "VehicleQR", "ZoneId", "PanelId"]
+        missing = [name for name in single_required if args[name] is None]
+        if missing:
+            ap.error("the following arguments are required without --manifest: "
+                     + ", ".join("--" + name for name in missing))
+    return args
 
 
-formatted_time = datetime.datetime.now().strftime("%d %b %Y %I:%M %p")
+def main(argv=None):
+    args = parse_args(argv)
+    if not (DB_USER and DB_PASS):
+        print("DB_USER and DB_PASS env vars must be set.")
+        sys.exit(1)
 
+    if args["manifest"]:
+        summary = run_batch(args["manifest"], args["out"], args["workers"], args["pool_size"])
+        if len(summary) and (summary["status"] != "ok").any():
+            sys.exit(2)
+    else:
+        run_single(args)
 
 
-df2=df_data[['Date','DutyOffTime','DutyOnTime']]
-print(df2[:50])
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Render vehicle report rows as plain-text facts for RAG.
+
+row_to_rag_fact() renders a single row. rag_facts() renders a whole DataFrame
+column-wise and produces exactly the same sentences, much faster on large
+exports (build_index.py --facts streams it into the encoder batch by batch).
+Missing numeric values are skipped; row_to_rag_fact would raise on them.
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+
+
+def row_to_rag_fact(row):
+    parts = []
+    parts.append(f"On {row['Date']} vehicle {row['VehicleNumber']}")
+    if row.get("TotalHouseCount", None) is not None:
+        parts.append(f"scanned {int(row['TotalHouseCount'])} houses")
+    if row.get("TotalDumpTrip", None) is not None:
+        parts.append(f"and did {int(row['TotalDumpTrip'])} dump trips")
+    if row.get("FirstHouseScan", None):
+        parts.append(f"first scan at {row['FirstHouseScan']}")
+    if row.get("LastHouseScan", None):
+        parts.append(f"last scan at {row['LastHouseScan']}")
+    if row.get("DutyOnTime", None) and row.get("DutyOffTime", None):
+        parts.append(f"duty {row['DutyOnTime']} - {row['DutyOffTime']}")
+    return ". ".join(parts) + "."
+
+
+def _objects(s):
+    # Same values iterrows would hand to row_to_rag_fact (Timestamps, time objects, ...)
+    return s.to_numpy(dtype=object)
+
+
+# Types whose equal values always print the same, so one rendering can serve
+# every equal value. Not floats (0.0 vs -0.0) or Decimals (1.0 vs 1.00, as
+# pymssql returns for NUMERIC columns).
+_SHARED_RENDER_TYPES = {str, int, bool, datetime.date, datetime.time, datetime.datetime, pd.Timestamp}
+
+
+def _as_str(s, prefix="", suffix=""):
+    """prefix + str(value) + suffix for every value, formatting each distinct value once."""
+    values = _objects(s)
+    kinds = set(map(type, values))
+    kinds.discard(type(None))
+    if len(kinds) > 1 or not kinds <= _SHARED_RENDER_TYPES:
+        # equal-but-differently-typed values (1 vs 1.0) must not share a rendering
+        return _render_each(values, prefix, suffix)
+
+    codes, uniques = pd.factorize(values)
+    # The same instant in two time zones compares equal but prints differently.
+    # Aware and naive values never compare equal, so checking uniques is enough.
+    if any(getattr(v, "tzinfo", None) is not None for v in uniques):
+        return _render_each(values, prefix, suffix)
+
+    rendered = np.array([f"{prefix}{v}{suffix}" for v in uniques] + [None], dtype=object)
+    out = rendered[codes]
+    nulls = codes == -1
+    if nulls.any():
+        out[nulls] = [f"{prefix}{v}{suffix}" for v in values[nulls]]
+    return out
+
+
+def _render_each(values, prefix, suffix):
+    return np.array([f"{prefix}{v}{suffix}" for v in values], dtype=object)
+
+
+def _as_int_str(s, mask, prefix="", suffix=""):
+    ints = s.where(mask, 0).astype("int64")
+    return _as_str(ints, prefix, suffix)
+
+
+def _truthy(s):
+    return _objects(s).astype(bool)
+
+
+def rag_facts(df):
+    """Render every row of df like row_to_rag_fact, column-wise. Returns a list of str."""
+    if df.empty:
+        return []
+
+    out = _as_str(df["Date"], "On ") + _as_str(df["VehicleNumber"], " vehicle ")
+
+    def add(mask, part):
+        nonlocal out
+        out = np.where(mask, out + part, out)
+
+    if "TotalHouseCount" in df.columns:
+        mask = df["TotalHouseCount"].notna().to_numpy()
+        add(mask, _as_int_str(df["TotalHouseCount"], mask, ". scanned ", " houses"))
+    if "TotalDumpTrip" in df.columns:
+        mask = df["TotalDumpTrip"].notna().to_numpy()
+        add(mask, _as_int_str(df["TotalDumpTrip"], mask, ". and did ", " dump trips"))
+    if "FirstHouseScan" in df.columns:
+        add(_truthy(df["FirstHouseScan"]), _as_str(df["FirstHouseScan"], ". first scan at "))
+    if "LastHouseScan" in df.columns:
+        add(_truthy(df["LastHouseScan"]), _as_str(df["LastHouseScan"], ". last scan at "))
+    if "DutyOnTime" in df.columns and "DutyOffTime" in df.columns:
+        mask = _truthy(df["DutyOnTime"]) & _truthy(df["DutyOffTime"])
+        add(mask, _as_str(df["DutyOnTime"], ". duty ") + _as_str(df["DutyOffTime"], " - "))
+
+    return (out + ".").tolist()
@@ -0,0 +1,160 @@
+"""Per-tenant (per-ULB) FAISS shards, loaded on demand with LRU eviction.
+
+Each tenant has its own shard directory and its own chunk store:
+
+  <root>/<tenant>/index.faiss        (written by build_index.py --tenant <tenant>)
+  Mongo collection "<MONGO_COLLECTION>_<tenant>" with faiss_idx/text documents
+
+Only shards that are actually queried are kept in memory. When the estimated
+size of the loaded shards exceeds the memory budget, the least recently used
+shards are dropped, so idle tenants don't hold RAM and a query only touches
+the data of the tenant(s) it asks about.
+"""
+import heapq
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+INDEX_FILENAME = "index.faiss"
+
+_TENANT_RE = re.compile(r"^[A-Za-z0-9_\-]+$")
+
+
+def validate_tenant(tenant):
+    """Return tenant if it is a safe directory/collection name, else raise ValueError."""
+    if not tenant or not _TENANT_RE.match(tenant):
+        raise ValueError(f"Invalid tenant name: {tenant!r}")
+    return tenant
+
+
+def shard_nbytes(index):
+    """Estimate the resident size of a FAISS index (flat float32 vectors)."""
+    return int(index.ntotal) * int(index.d) * 4
+
+
+class Shard:
+    """A loaded tenant shard: its FAISS index and the index file mtime it was read at."""
+
+    def __init__(self, tenant, index, mtime=None):
+        self.tenant = tenant
+        self.index = index
+        self.mtime = mtime
+        self.nbytes = shard_nbytes(index)
+
+
+class IndexRegistry:
+    """Tenant -> Shard registry with an LRU memory budget.
+
+    loader: callable(tenant) -> faiss index.
+    on_reload: optional callable(tenant), called when a shard is loaded from an
+        index file that changed since the tenant was last loaded. Reloading an
+        unchanged shard after LRU eviction does not call it.
+    """
+
+    def __init__(self, root, budget_bytes, loader, on_reload=None, max_workers=4):
+        self.root = root
+        self.budget_bytes = int(budget_bytes)
+        self.loader = loader
+        self.on_reload = on_reload
+        self.max_workers = max_workers
+        self._shards = OrderedDict()
+        self._mtimes = {}  # tenant -> index file mtime at its last load, kept across evictions
+        self._lock = threading.Lock()
+
+    def tenants(self):
+        """List tenants that have a shard on disk."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name for name in os.listdir(self.root)
+            if _TENANT_RE.match(name) and os.path.isfile(os.path.join(self.root, name, INDEX_FILENAME))
+        )
+
+    def loaded(self):
+        """Tenants currently in memory, least recently used first."""
+        with self._lock:
+            return list(self._shards)
+
+    def loaded_bytes(self):
+        with self._lock:
+            return sum(s.nbytes for s in self._shards.values())
+
+    def _mtime(self, tenant):
+        try:
+            return os.path.getmtime(os.path.join(self.root, tenant, INDEX_FILENAME))
+        except OSError:
+            return None
+
+    def get(self, tenant):
+        """Return the shard for tenant, loading it (and evicting others) if needed.
+
+        A loaded shard whose index file has changed on disk is reloaded.
+        """
+        validate_tenant(tenant)
+        mtime = self._mtime(tenant)
+        with self._lock:
+            shard = self._shards.get(tenant)
+            if shard is not None and shard.mtime == mtime:
+                self._shards.move_to_end(tenant)
+                return shard
+
+        # Load outside the lock so other tenants are not blocked on disk I/O.
+        shard = Shard(tenant, self.loader(tenant), mtime)
+
+        with self._lock:
+            existing = self._shards.get(tenant)
+            if existing is not None and existing.mtime == mtime:
+                # Another thread loaded it first; keep theirs.
+                self._shards.move_to_end(tenant)
+                return existing
+            self._shards[tenant] = shard
+            self._shards.move_to_end(tenant)
+            self._evict_locked(keep=tenant)
+            changed = tenant in self._mtimes and self._mtimes[tenant] != mtime
+            self._mtimes[tenant] = mtime
+
+        if changed and self.on_reload is not None:
+            self.on_reload(tenant)
+        return shard
+
+    def evict(self, tenant):
+        with self._lock:
+            self._shards.pop(tenant, None)
+
+    def clear(self):
+        with self._lock:
+            self._shards.clear()
+
+    def _evict_locked(self, keep):
+        total = sum(s.nbytes for s in self._shards.values())
+        for name in list(self._shards):
+            if total <= self.budget_bytes:
+                break
+            if name == keep:
+                continue
+            total -= self._shards.pop(name).nbytes
+
+    def search(self, tenant, emb, k):
+        """Search one tenant's shard. Returns a list of (score, tenant, faiss_idx)."""
+        shard = self.get(tenant)
+        D, I = shard.index.search(emb, k)
+        return [
+            (float(score), tenant, int(idx))
+            for idx, score in zip(I[0], D[0])
+            if int(idx) >= 0
+        ]
+
+    def search_many(self, tenants, emb, k):
+        """Fan a query out over several tenants and merge the global top-k by score."""
+        tenants = list(dict.fromkeys(tenants))
+        if not tenants:
+            return []
+        if len(tenants) == 1:
+            return self.search(tenants[0], emb, k)
+
+        workers = max(1, min(self.max_workers, len(tenants)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            per_tenant = list(pool.map(lambda t: self.search(t, emb, k), tenants))
+        return heapq.nlargest(k, (hit for hits in per_tenant for hit in hits), key=lambda h: h[0])
@@ -0,0 +1,106 @@
+"""Semantic answer cache keyed on query embeddings.
+
+Past questions are kept in a small FAISS index next to their answers. A new
+question reuses a stored answer only when:
+
+  - its embedding is at least `threshold` similar (inner product on
+    L2-normalized vectors) to the stored question,
+  - its canonical key matches (e.g. the normalized vehicle numbers it mentions),
+  - and retrieval returned the same chunk ids, i.e. the answer would be built
+    from exactly the same context.
+
+The cache is bounded (LRU eviction) and can be invalidated wholesale or per
+tenant when an index is reloaded.
+"""
+import threading
+from collections import OrderedDict
+
+import faiss
+import numpy as np
+
+
+class SemanticCache:
+    def __init__(self, max_entries=256, threshold=0.92, candidates=8):
+        self.max_entries = int(max_entries)
+        self.threshold = float(threshold)
+        self.candidates = int(candidates)
+        self._index = None  # created on first store, once the embedding size is known
+        self._entries = OrderedDict()  # id -> (key, chunk_ids, answer)
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0  # questions that could not use the cache at all
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, emb, key, chunk_ids):
+        """Return a cached answer for this query, or None."""
+        chunk_ids = tuple(chunk_ids)
+        with self._lock:
+            if self._index is None or not self._entries:
+                self.misses += 1
+                return None
+            D, I = self._index.search(emb, min(self.candidates, len(self._entries)))
+            for entry_id, score in zip(I[0], D[0]):
+                entry_id = int(entry_id)
+                if entry_id < 0 or score < self.threshold:
+                    continue
+                entry_key, entry_chunks, answer = self._entries[entry_id]
+                if entry_key == key and entry_chunks == chunk_ids:
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return answer
+            self.misses += 1
+            return None
+
+    def skip(self):
+        """Count a question answered without consulting the cache."""
+        with self._lock:
+            self.skipped += 1
+
+    def store(self, emb, key, chunk_ids, answer):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if self._index is None:
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(emb.shape[1]))
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(emb[:1], np.array([entry_id], dtype="int64"))
+            self._entries[entry_id] = (key, tuple(chunk_ids), answer)
+            while len(self._entries) > self.max_entries:
+                old_id, _ = self._entries.popitem(last=False)
+                self._remove_locked([old_id])
+                self.evictions += 1
+
+    def invalidate(self, tenant=None):
+        """Drop every entry, or only entries built from chunks of `tenant`."""
+        with self._lock:
+            if tenant is None:
+                stale = list(self._entries)
+            else:
+                stale = [
+                    entry_id for entry_id, (_, chunk_ids, _) in self._entries.items()
+                    if any(chunk_tenant == tenant for chunk_tenant, _ in chunk_ids)
+                ]
+            for entry_id in stale:
+                del self._entries[entry_id]
+            self._remove_locked(stale)
+
+    def _remove_locked(self, ids):
+        if ids and self._index is not None:
+            self._index.remove_ids(np.array(ids, dtype="int64"))
+
+    def stats(self):
+        total = self.hits + self.misses + self.skipped
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "skipped": self.skipped,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,189 @@
+"""Server-side chat sessions in a local SQLite file.
+
+Every turn is one small row keyed by (session_id, seq), so conversations
+survive reconnects and can be read a page at a time. Older turns can be
+folded into a short per-session digest (see summarize()), letting the chatbot
+keep long conversations in its prompt at a fixed size.
+
+A session row is only written with its first turn, so visits that never ask
+anything leave nothing behind, and expire() drops sessions idle for too long.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    created REAL NOT NULL,  -- also reset by clear(); expire() counts idle time from it
+    next_seq INTEGER NOT NULL DEFAULT 0,  -- never reused, even after clear()
+    digest TEXT NOT NULL DEFAULT '',
+    digest_upto INTEGER NOT NULL DEFAULT 0  -- turns with seq < digest_upto are in the digest
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS turns (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    ts REAL NOT NULL,
+    user TEXT NOT NULL,
+    assistant TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+"""
+
+_SESSION_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+def valid_session_id(sid):
+    """True if sid looks like an id from SessionStore.new_session()."""
+    return bool(sid) and bool(_SESSION_ID_RE.match(sid))
+
+
+class SessionStore:
+    def __init__(self, path):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._last_expire = 0.0
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def new_session(self):
+        """A fresh session id; the session is stored with its first turn."""
+        return uuid.uuid4().hex
+
+    def append_turn(self, sid, user, assistant):
+        """Append a (user, assistant) turn; returns its sequence number."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("INSERT OR IGNORE INTO sessions (id, created) VALUES (?, ?)", (sid, now))
+                (seq,) = self._conn.execute("SELECT next_seq FROM sessions WHERE id = ?", (sid,)).fetchone()
+                self._conn.execute("UPDATE sessions SET next_seq = ? WHERE id = ?", (seq + 1, sid))
+                self._conn.execute(
+                    "INSERT INTO turns (session_id, seq, ts, user, assistant) VALUES (?, ?, ?, ?, ?)",
+                    (sid, seq, now, user, assistant),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return seq
+
+    def count_turns(self, sid):
+        return self._query("SELECT COUNT(*) FROM turns WHERE session_id = ?", (sid,))[0][0]
+
+    def page(self, sid, page=0, page_size=10):
+        """Turns of one page, oldest first; page 0 is the most recent page."""
+        rows = self._query(
+            "SELECT seq, user, assistant FROM turns WHERE session_id = ? "
+            "ORDER BY seq DESC LIMIT ? OFFSET ?",
+            (sid, page_size, page * page_size),
+        )
+        return rows[::-1]
+
+    def iter_turns(self, sid, batch_size=500):
+        """Yield every turn as (seq, user, assistant) without loading the whole session."""
+        last = -1
+        while True:
+            rows = self._query(
+                "SELECT seq, user, assistant FROM turns WHERE session_id = ? AND seq > ? "
+                "ORDER BY seq LIMIT ?",
+                (sid, last, batch_size),
+            )
+            if not rows:
+                return
+            yield from rows
+            last = rows[-1][0]
+
+    def context(self, sid, max_turns=13):
+        """(digest, turns) for a prompt: turns not yet folded into the digest, oldest first.
+
+        Together they cover the whole conversation while summarize() keeps up
+        (at most keep_recent + min_batch - 1 turns). If it falls behind, e.g.
+        the LLM is down, only the last max_turns are returned so the prompt
+        stays bounded; the older ones are folded once summaries work again.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT digest, digest_upto FROM sessions WHERE id = ?", (sid,)).fetchall()
+            if not rows:
+                return "", []
+            digest, upto = rows[0]
+            turns = self._conn.execute(
+                "SELECT user, assistant FROM turns WHERE session_id = ? AND seq >= ? ORDER BY seq DESC LIMIT ?",
+                (sid, upto, max_turns),
+            ).fetchall()
+        return digest, [(u, a) for u, a in reversed(turns)]
+
+    def clear(self, sid):
+        with self._lock:
+            self._conn.execute("DELETE FROM turns WHERE session_id = ?", (sid,))
+            # keep the row (next_seq is never reused) and restart its idle time for expire()
+            self._conn.execute(
+                "UPDATE sessions SET digest = '', digest_upto = next_seq, created = ? WHERE id = ?",
+                (time.time(), sid),
+            )
+
+    def expire(self, max_idle, every=0.0):
+        """Delete sessions with no turn (or creation) in the last max_idle seconds.
+
+        Skipped if the previous sweep ran less than `every` seconds ago.
+        Returns the number of sessions deleted.
+        """
+        now = time.time()
+        with self._lock:
+            if now - self._last_expire < every:
+                return 0
+            self._last_expire = now
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                stale = self._conn.execute(
+                    "SELECT s.id FROM sessions s WHERE MAX(s.created, "
+                    "COALESCE((SELECT MAX(t.ts) FROM turns t WHERE t.session_id = s.id), 0)) < ?",
+                    (now - max_idle,),
+                ).fetchall()
+                self._conn.executemany("DELETE FROM turns WHERE session_id = ?", stale)
+                self._conn.executemany("DELETE FROM sessions WHERE id = ?", stale)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(stale)
+
+    def summarize(self, sid, summarizer, keep_recent=3, min_batch=3, max_batch=10, char_limit=600):
+        """Fold turns older than the last keep_recent into the session digest.
+
+        summarizer(old_digest, turns) -> new digest, where turns is a list of
+        (user, assistant). Runs once at least min_batch turns are waiting and
+        folds at most max_batch per call, so each call sends a bounded amount
+        of text. Returns True if the digest changed.
+        """
+        rows = self._query("SELECT digest, digest_upto, next_seq FROM sessions WHERE id = ?", (sid,))
+        if not rows:
+            return False
+        old_digest, upto, next_seq = rows[0]
+        end = min(next_seq - keep_recent, upto + max_batch)
+        if end - upto < min_batch:
+            return False
+
+        turns = self._query(
+            "SELECT user, assistant FROM turns WHERE session_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+            (sid, upto, end),
+        )
+        new_digest = (summarizer(old_digest, turns) or "").strip()[:char_limit]
+
+        # Only apply if no other run or clear() moved digest_upto meanwhile.
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE sessions SET digest = ?, digest_upto = ? WHERE id = ? AND digest_upto = ?",
+                (new_digest, end, sid, upto),
+            )
+        return cur.rowcount == 1
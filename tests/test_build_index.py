@@ -33,3 +33,47 @@ def test_load_data_from_csv_builds_text(tmp_path):
     t = df.iloc[0]["text"]
     assert "Demo User" in t
     assert "MH00-XX-0000" in t
+
+
+def test_load_data_from_csv_chunks_long_text(tmp_path):
+    csv_path = tmp_path / "long.csv"
+    csv_path.write_text(
+        "Date,emp_id,EmployeeName,vehicleNumber,Target,mixed_waste,segregate_waste,Not_collected,Not_specified,Not_Scan,TotalHouseCount,duty_on_time,duty_off_time,working_time,DutyDurationInHours,FirstHouseScan,LastHouseScan,DumpTrip\n"  # noqa: E501
+        "01-01-2025,9999,Demo User,MH00-XX-0000,500,10,50,0,0,0,60,06:00 AM,08:00 AM,120,02:00,6:05AM,7:55AM,1\n"
+        f"02-01-2025,9998,{'A' * 600},MH00-XX-0001,500,10,50,0,0,0,60,06:00 AM,08:00 AM,120,02:00,6:05AM,7:55AM,1\n"
+    )
+
+    df = load_data_from_csv(str(csv_path))
+    assert df["id"].tolist() == ["0-0", "1-0", "1-1"]
+    assert "".join(df["text"].iloc[1:]).startswith("Date: 02-01-2025")
+
+
+def test_load_data_from_csv_header_only(tmp_path):
+    csv_path = tmp_path / "empty.csv"
+    csv_path.write_text(
+        "Date,emp_id,EmployeeName,vehicleNumber,Target,mixed_waste,segregate_waste,Not_collected,Not_specified,Not_Scan,TotalHouseCount,duty_on_time,duty_off_time,working_time,DutyDurationInHours,FirstHouseScan,LastHouseScan,DumpTrip\n"  # noqa: E501
+    )
+
+    df = load_data_from_csv(str(csv_path))
+    assert df.empty
+    assert list(df.columns) == ["id", "text"]
+
+
+def test_iter_fact_input_streams_parquet_in_batches(tmp_path):
+    from build_index import iter_fact_input
+    from facts import rag_facts
+
+    report = pd.DataFrame(
+        {
+            "Date": ["2024-06-01", "2024-06-02", "2024-06-03"],
+            "VehicleNumber": ["MH08AP1894"] * 3,
+            "TotalHouseCount": [120, 80, 95],
+            "TotalDumpTrip": [2, 1, 2],
+        }
+    )
+    path = tmp_path / "report.parquet"
+    report.to_parquet(path, index=False)
+
+    batches = list(iter_fact_input(str(path), batch_size=2))
+    assert [ids for ids, _ in batches] == [["0-0", "1-0"], ["2-0"]]
+    assert [t for _, texts in batches for t in texts] == rag_facts(report)
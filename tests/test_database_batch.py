@@ -0,0 +1,121 @@
+import contextlib
+import time
+
+import pandas as pd
+import pytest
+
+import database
+
+
+class DummyPool:
+    def __init__(self):
+        self.databases = []
+
+    @contextlib.contextmanager
+    def connection(self, db):
+        self.databases.append(db)
+        yield object()
+
+    def close(self):
+        pass
+
+
+class DummyFigure:
+    def write_html(self, path, include_plotlyjs=True):
+        with open(path, "w") as f:
+            f.write("<html></html>")
+
+
+def write_manifest(path, rows):
+    pd.DataFrame(rows).to_csv(path, index=False)
+
+
+def test_load_manifest_requires_columns(tmp_path):
+    path = tmp_path / "jobs.csv"
+    write_manifest(path, [{"server": "s", "database": "d"}])
+    with pytest.raises(ValueError):
+        database.load_manifest(str(path))
+
+
+def test_load_manifest_rejects_duplicate_outputs(tmp_path):
+    path = tmp_path / "jobs.csv"
+    job = {"server": "s", "database": "d", "ulbname": "ULB", "VehicleQR": "26",
+           "FromDate": "2024-06-01", "ToDate": "2024-06-02", "ZoneId": "1", "PanelId": "0"}
+    write_manifest(path, [job, dict(job, ZoneId="2")])
+    assert len(database.load_manifest(str(path))) == 2
+
+    write_manifest(path, [job, dict(job, ZoneId="01")])
+    with pytest.raises(ValueError, match="same report"):
+        database.load_manifest(str(path))
+
+
+@pytest.mark.parametrize("bad", [{"ulbname": "../etc"}, {"FromDate": "2024/06/01"}])
+def test_load_manifest_rejects_unsafe_paths(tmp_path, bad):
+    path = tmp_path / "jobs.csv"
+    job = {"server": "s", "database": "d", "ulbname": "ULB", "VehicleQR": "26",
+           "FromDate": "2024-06-01", "ToDate": "2024-06-02"}
+    write_manifest(path, [dict(job, **bad)])
+    with pytest.raises(ValueError):
+        database.load_manifest(str(path))
+
+
+def test_query_params_defaults_zone_and_panel():
+    params = database.query_params(
+        {"FromDate": "2024-06-01", "ToDate": "2024-06-02", "VehicleQR": "26", "ZoneId": ""}
+    )
+    assert params == {"from": "2024-06-01", "to": "2024-06-02", "vqr": 26, "zone": 0, "panel": 0}
+
+
+def test_run_batch_writes_outputs_and_summary(tmp_path, monkeypatch):
+    manifest = tmp_path / "jobs.csv"
+    job = {"server": "srv", "database": "db1", "ulbname": "ULB", "FromDate": "2024-06-01", "ToDate": "2024-06-02"}
+    write_manifest(manifest, [
+        dict(job, VehicleQR="26", ZoneId="1"),
+        dict(job, VehicleQR="26", ZoneId="2"),
+        dict(job, VehicleQR="27"),
+    ])
+
+    def fake_fetch(conn, job):
+        if job["VehicleQR"] == "27":
+            raise RuntimeError("boom")
+        houses = 5 if job["ZoneId"] == "1" else 9
+        return pd.DataFrame({"Date": ["2024-06-01"], "TotalHouseCount": [houses], "TotalDumpTrip": [1]})
+
+    pool = DummyPool()
+    monkeypatch.setattr(database, "ConnectionPool", lambda *a, **kw: pool)
+    monkeypatch.setattr(database, "fetch_report", fake_fetch)
+    monkeypatch.setattr(database, "render_report", lambda df, job: DummyFigure())
+
+    out = tmp_path / "out"
+    summary = database.run_batch(str(manifest), str(out), workers=2)
+
+    ok = summary[summary["status"] == "ok"]
+    assert ok["ZoneId"].tolist() == ["1", "2"]
+    assert ok["rows"].tolist() == [1, 1]
+    assert ok["parquet"].nunique() == 2
+    failed = summary[summary["VehicleQR"] == "27"].iloc[0]
+    assert failed["status"] == "failed"
+    assert "boom" in failed["error"]
+    assert pool.databases == ["db1", "db1", "db1"]
+    assert pd.read_parquet(out / "ULB" / "26_2024-06-01_2024-06-02_z1_p0.parquet")["TotalHouseCount"].tolist() == [5]
+    assert pd.read_parquet(out / "ULB" / "26_2024-06-01_2024-06-02_z2_p0.parquet")["TotalHouseCount"].tolist() == [9]
+    assert (out / "ULB" / "26_2024-06-01_2024-06-02_z1_p0.html").exists()
+    assert (out / "run_summary.csv").exists()
+
+
+def test_run_job_excludes_connection_wait_from_seconds(tmp_path, monkeypatch):
+    class SlowPool(DummyPool):
+        @contextlib.contextmanager
+        def connection(self, db):
+            time.sleep(0.2)  # another job holds the only connection
+            yield object()
+
+    monkeypatch.setattr(database, "fetch_report", lambda conn, job: pd.DataFrame({"Date": []}))
+    monkeypatch.setattr(database, "render_report", lambda df, job: DummyFigure())
+    job = {"server": "s", "database": "d", "ulbname": "ULB", "VehicleQR": "26",
+           "FromDate": "2024-06-01", "ToDate": "2024-06-02"}
+
+    record = database.run_job(SlowPool(), job, str(tmp_path))
+    assert record["status"] == "ok"
+    assert record["wait_seconds"] >= 0.2
+    assert record["seconds"] < 0.2
@@ -0,0 +1,58 @@
+import datetime
+
+import pandas as pd
+
+from facts import rag_facts, row_to_rag_fact
+
+
+def report_frame():
+    return pd.DataFrame(
+        {
+            "Date": [datetime.date(2024, 6, 1), datetime.date(2024, 6, 2), datetime.date(2024, 6, 3)],
+            "VehicleNumber": ["MH08AP1894", "MH08AP1894", None],
+            "FirstHouseScan": [datetime.time(6, 5), None, datetime.time(7, 0, 0, 250000)],
+            "LastHouseScan": [datetime.time(11, 30), None, ""],
+            "TotalHouseCount": [120, 0, 7],
+            "LastDumpScan": [datetime.time(12, 0), None, None],
+            "TotalDumpTrip": [2, 0, 1],
+            "DutyOnTime": ["06:00", None, "07:00"],
+            "DutyOffTime": ["14:00", "13:00", None],
+        }
+    )
+
+
+def test_rag_facts_matches_row_to_rag_fact():
+    df = report_frame()
+    expected = [row_to_rag_fact(r) for _, r in df.iterrows()]
+    assert rag_facts(df) == expected
+    assert expected[0] == (
+        "On 2024-06-01 vehicle MH08AP1894. scanned 120 houses. and did 2 dump trips. "
+        "first scan at 06:05:00. last scan at 11:30:00. duty 06:00 - 14:00."
+    )
+
+
+def test_rag_facts_optional_columns_missing():
+    df = pd.DataFrame({"Date": [pd.Timestamp("2024-06-01")], "VehicleNumber": ["X"]})
+    assert rag_facts(df) == [row_to_rag_fact(df.iloc[0])]
+    assert rag_facts(df.iloc[:0]) == []
+
+
+def test_rag_facts_keeps_distinct_renderings_of_equal_values():
+    from decimal import Decimal
+
+    # equal values that print differently: NUMERIC columns from pymssql, mixed time zones
+    df = pd.DataFrame(
+        {
+            "Date": [datetime.date(2024, 6, 1)] * 2,
+            "VehicleNumber": pd.Series([Decimal("1.0"), Decimal("1.00")], dtype=object),
+            "DutyOnTime": pd.Series(
+                [pd.Timestamp("2024-06-01 06:00", tz="UTC"), pd.Timestamp("2024-06-01 11:30", tz="Asia/Kolkata")],
+                dtype=object,
+            ),
+            "DutyOffTime": ["14:00"] * 2,
+        }
+    )
+    expected = [row_to_rag_fact(r) for _, r in df.iterrows()]
+    assert rag_facts(df) == expected
+    assert "vehicle 1.0." in expected[0] and "vehicle 1.00." in expected[1]
+    assert "06:00:00+00:00" in expected[0] and "11:30:00+05:30" in expected[1]
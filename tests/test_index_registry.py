@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+
+from index_registry import IndexRegistry, validate_tenant
+
+
+class DummyIndex:
+    def __init__(self, scores, indices, ntotal=10, d=4):
+        self._scores = scores
+        self._indices = indices
+        self.ntotal = ntotal
+        self.d = d
+
+    def search(self, emb, k):
+        return (np.array([self._scores[:k]], dtype="float32"),
+                np.array([self._indices[:k]], dtype="int64"))
+
+
+def make_loader(indexes, calls):
+    def loader(tenant):
+        calls.append(tenant)
+        return indexes[tenant]
+    return loader
+
+
+def test_get_loads_once_and_caches():
+    calls = []
+    reg = IndexRegistry("unused", budget_bytes=10_000,
+                        loader=make_loader({"a": DummyIndex([0.9], [0])}, calls))
+
+    shard = reg.get("a")
+    assert shard.index is not None
+    assert reg.get("a") is shard
+    assert calls == ["a"]
+
+
+def test_lru_eviction_under_budget():
+    calls = []
+    # each shard is 10 * 4 * 4 = 160 bytes; budget fits two
+    indexes = {t: DummyIndex([0.5], [0]) for t in ("a", "b", "c")}
+    reg = IndexRegistry("unused", budget_bytes=320, loader=make_loader(indexes, calls))
+
+    reg.get("a")
+    reg.get("b")
+    reg.get("a")  # a is now most recently used
+    reg.get("c")
+
+    assert reg.loaded() == ["a", "c"]
+    assert reg.loaded_bytes() <= 320
+
+
+def test_oversized_shard_is_still_served():
+    reg = IndexRegistry("unused", budget_bytes=1,
+                        loader=make_loader({"a": DummyIndex([0.5], [0])}, []))
+    assert reg.get("a").tenant == "a"
+    assert reg.loaded() == ["a"]
+
+
+def test_search_many_merges_top_k():
+    indexes = {
+        "a": DummyIndex([0.9, 0.4], [0, 1]),
+        "b": DummyIndex([0.7, 0.6], [0, 1]),
+    }
+    reg = IndexRegistry("unused", budget_bytes=10_000, loader=make_loader(indexes, []))
+
+    hits = reg.search_many(["a", "b"], np.zeros((1, 4), dtype="float32"), k=3)
+    assert hits == [
+        (pytest.approx(0.9), "a", 0),
+        (pytest.approx(0.7), "b", 0),
+        (pytest.approx(0.6), "b", 1),
+    ]
+
+
+def test_tenants_lists_shards_on_disk(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "index.faiss").write_bytes(b"")
+    (tmp_path / "empty").mkdir()
+    reg = IndexRegistry(str(tmp_path), budget_bytes=0, loader=None)
+    assert reg.tenants() == ["a"]
+
+
+def test_validate_tenant_rejects_paths():
+    with pytest.raises(ValueError):
+        validate_tenant("../etc")
+
+
+def test_on_reload_only_when_index_file_changes(tmp_path):
+    import os
+
+    for t in ("a", "b"):
+        (tmp_path / t).mkdir()
+        (tmp_path / t / "index.faiss").write_bytes(b"")
+    calls, reloads = [], []
+    indexes = {t: DummyIndex([0.5], [0]) for t in ("a", "b")}
+    # budget fits one shard, so a and b keep evicting each other
+    reg = IndexRegistry(str(tmp_path), budget_bytes=160,
+                        loader=make_loader(indexes, calls), on_reload=reloads.append)
+
+    reg.get("a")
+    reg.get("b")
+    reg.get("a")  # reloaded after eviction, file unchanged
+    assert calls == ["a", "b", "a"]
+    assert reloads == []
+
+    path = tmp_path / "a" / "index.faiss"
+    st = os.stat(path)
+    os.utime(path, (st.st_atime, st.st_mtime + 10))
+    reg.get("a")  # still loaded, but the file changed
+    assert calls == ["a", "b", "a", "a"]
+    assert reloads == ["a"]
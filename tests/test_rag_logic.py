@@ -1,3 +1,4 @@
+import datetime
 import types
 
 import app
@@ -55,7 +56,7 @@ def test_retrieve_returns_ranked_results(monkeypatch):
 
 def test_rag_idk_when_no_context(monkeypatch):
     # Force retrieve to return empty list
-    monkeypatch.setattr(app, "retrieve", lambda q, k=3: [])
+    monkeypatch.setattr(app, "retrieve", lambda q, k=3, tenants=None, emb=None: [])
 
     out = app.rag("anything")
     assert out == app.IDK_MESSAGE
@@ -66,7 +67,7 @@ def test_rag_calls_ollama_when_confident(monkeypatch):
     monkeypatch.setattr(
         app,
         "retrieve",
-        lambda q, k=3: [{"text": "Some context", "score": app.STRICT_REFUSAL_THRESHOLD + 0.1}],
+        lambda q, k=3, tenants=None, emb=None: [{"text": "Some context", "score": app.STRICT_REFUSAL_THRESHOLD + 0.1}],
     )
 
     # Dummy ollama.chat that returns a predictable answer
@@ -80,3 +81,197 @@ def test_rag_calls_ollama_when_confident(monkeypatch):
 
     out = app.rag("question")
     assert "Hello from test model" in out
+
+
+def test_retrieve_across_tenants_loads_each_shard_once(monkeypatch):
+    from index_registry import IndexRegistry
+
+    loads = []
+
+    def loader(tenant):
+        loads.append(tenant)
+        # 10 vectors * 4 dims * 4 bytes = 160 bytes per shard
+        shard = DummyIndex(scores=[0.9 if tenant == "a" else 0.5], indices=[0])
+        shard.ntotal, shard.d = 10, 4
+        return shard
+
+    # budget fits two of the three shards
+    registry = IndexRegistry("unused", budget_bytes=320, loader=loader)
+    monkeypatch.setattr(app, "get_registry", lambda: registry)
+    monkeypatch.setattr(
+        app, "tenant_docs", lambda t: DummyMongo({0: {"faiss_idx": 0, "text": f"doc from {t}"}})
+    )
+    app.embedder = DummyEmbedder()
+
+    results = app.retrieve("test query", k=3, tenants=["a", "b", "c"])
+    assert sorted(loads) == ["a", "b", "c"]
+    assert results[0]["text"] == "doc from a"
+    assert {r["tenant"] for r in results} == {"a", "b", "c"}
+
+
+def test_query_cache_key_normalizes_vehicles_and_keeps_dates():
+    today = datetime.date(2024, 6, 6)
+    key = app.query_cache_key
+    assert key("houses done by MH08AP1894 yesterday", today=today) == key(
+        "how many houses did MH08-AP-1894 cover yesterday", today=today
+    )
+    assert key("MH08AP1894 on 2024-06-05") == key("mh08-ap-1894 on 05-06-2024")
+    assert key("MH08AP1894 on 2024-06-05") != key("MH08AP1894 on 2024-06-06")
+    assert key("MH08AP1894 yesterday", today=today) != key("MH08AP1894 today", today=today)
+    assert key("MH08AP1894 yesterday", today=today) != key(
+        "MH08AP1894 yesterday", today=datetime.date(2024, 6, 7)
+    )
+    assert key("MH08AP1894 on 5 June") != key("MH08AP1894 on 6 June")
+    assert key("q", tenants=["a"]) != key("q", tenants=["b"])
+
+
+def test_query_cache_key_keeps_what_is_asked():
+    today = datetime.date(2024, 6, 6)
+    key = app.query_cache_key
+    assert key("What was the first scan time of MH08AP1894 yesterday", today=today) != key(
+        "What was the last scan time of MH08AP1894 yesterday", today=today
+    )
+    assert key("How many houses did MH08AP1894 cover on 2024-06-05") != key(
+        "How many dump trips did MH08AP1894 do on 2024-06-05"
+    )
+    assert key("duty on time of MH08AP1894 on 2024-06-05") != key("duty off time of MH08AP1894 on 2024-06-05")
+    # "last week" is a relative day, not the last scan
+    assert key("MH08AP1894 last week", today=today).attributes == ()
+    assert app.is_self_contained(key("houses by MH08AP1894 yesterday"))
+    assert not app.is_self_contained(key("and the day before?"))
+    assert not app.is_self_contained(key("houses on 2024-06-05"))
+
+
+class ConstantEmbedder:
+    def encode(self, texts, convert_to_numpy=True):
+        import numpy as np
+
+        return np.ones((len(texts), 4), dtype="float32")
+
+
+def setup_cached_rag(monkeypatch):
+    from semantic_cache import SemanticCache
+
+    cache = SemanticCache(max_entries=8, threshold=0.9)
+    monkeypatch.setattr(app, "get_answer_cache", lambda: cache)
+    monkeypatch.setattr(app, "embedder", ConstantEmbedder())
+    monkeypatch.setattr(
+        app,
+        "retrieve",
+        lambda q, k=3, tenants=None, emb=None: [
+            {"text": "Some context", "score": app.STRICT_REFUSAL_THRESHOLD + 0.1, "faiss_idx": 7, "tenant": None}
+        ],
+    )
+    calls = []
+
+    def dummy_chat(model, messages):
+        calls.append(messages[0]["content"])
+        return {"message": {"content": f"answer {len(calls)}"}}
+
+    monkeypatch.setattr(app, "ollama", types.SimpleNamespace(chat=dummy_chat))
+    return calls
+
+
+def test_rag_reuses_answer_for_rephrased_question(monkeypatch):
+    calls = setup_cached_rag(monkeypatch)
+
+    first, _ = app.rag("houses done by MH08AP1894 yesterday")
+    second, _ = app.rag("how many houses did MH08-AP-1894 cover yesterday")
+    assert len(calls) == 1
+    assert second == first
+
+
+def test_rag_does_not_reuse_answer_for_other_date_or_attribute(monkeypatch):
+    calls = setup_cached_rag(monkeypatch)
+
+    app.rag("How many houses did MH08AP1894 cover on 2024-06-05")
+    app.rag("How many houses did MH08AP1894 cover on 2024-06-06")
+    assert len(calls) == 2
+
+    # same vehicle, day and chunk, and the embeddings are identical here
+    first, _ = app.rag("What was the first scan time of MH08AP1894 on 2024-06-05")
+    last, _ = app.rag("What was the last scan time of MH08AP1894 on 2024-06-05")
+    dump, _ = app.rag("How many dump trips did MH08AP1894 do on 2024-06-05")
+    assert len(calls) == 5
+    assert len({first, last, dump}) == 3
+
+
+def test_rag_follow_up_depends_on_conversation(monkeypatch):
+    calls = setup_cached_rag(monkeypatch)
+
+    app.rag("and the day before?")
+    app.rag("and the day before?", history=[("houses by MH08AP1894 on 2024-06-05?", "120")])
+    app.rag("and the day before?", digest="Asked about MH08AP1895.")
+    assert len(calls) == 3
+    assert app.get_answer_cache().stats()["skipped"] == 2
+
+
+class InlinePool:
+    """Runs submitted work right away, like summary_pool with an idle worker."""
+
+    def submit(self, fn, *args, **kwargs):
+        from concurrent.futures import Future
+
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+def setup_chat(monkeypatch, summarizer=lambda old, turns: "summary"):
+    from session_store import SessionStore
+
+    store = SessionStore(":memory:")
+    monkeypatch.setattr(app, "sessions", store)
+    monkeypatch.setattr(app, "summary_pool", InlinePool())
+    monkeypatch.setattr(app, "summarize_turns", summarizer)
+    return store, store.new_session()
+
+
+def test_chat_reuses_answer_for_rephrased_follow_up(monkeypatch):
+    calls = setup_cached_rag(monkeypatch)
+    store, sid = setup_chat(monkeypatch)
+    for i in range(5):
+        store.append_turn(sid, f"q{i}", f"a{i}")
+
+    first, _ = app.chat_turn(sid, "houses done by MH08AP1894 yesterday")
+    second, _ = app.chat_turn(sid, "how many houses did MH08-AP-1894 cover yesterday")
+    assert len(calls) == 1
+    assert second == first
+    assert store.count_turns(sid) == 7
+
+
+def test_rag_puts_digest_and_history_in_prompt(monkeypatch):
+    calls = setup_cached_rag(monkeypatch)
+
+    app.rag(
+        "and the day before?",
+        history=[("q0", "a0"), ("q1", "a1"), ("q2", "a2"), ("q3", "a3")],
+        digest="Supervisor asked about MH08AP1894 on 2024-06-05.",
+    )
+    prompt = calls[0]
+    assert "Summary of earlier conversation" in prompt
+    assert "Supervisor asked about MH08AP1894 on 2024-06-05." in prompt
+    # every unsummarized turn is sent, not just the last three
+    assert "User: q0\nAssistant: a0" in prompt
+    assert "User: q3\nAssistant: a3" in prompt
+
+
+def test_chat_prompt_stays_bounded_when_summaries_fail(monkeypatch, caplog):
+    calls = setup_cached_rag(monkeypatch)
+
+    def failing(old, turns):
+        raise RuntimeError("ollama down")
+
+    store, sid = setup_chat(monkeypatch, summarizer=failing)
+    for i in range(20):
+        store.append_turn(sid, f"q{i}", f"a{i}")
+
+    with caplog.at_level("ERROR", logger="app"):
+        app.chat_turn(sid, "and the day before?")
+    prompt = calls[0]
+    assert prompt.count("User: q") == app.HISTORY_TURNS + app.SUMMARY_BATCH
+    assert "User: q6\n" not in prompt and "User: q19\n" in prompt
+    assert "ollama down" in caplog.text
@@ -0,0 +1,70 @@
+import numpy as np
+
+from semantic_cache import SemanticCache
+
+
+def vec(*values):
+    v = np.array([values], dtype="float32")
+    return v / np.linalg.norm(v)
+
+
+KEY = (("MH08AP1894",), ())
+CHUNKS = [(None, 0), (None, 3)]
+
+
+def test_hit_on_near_duplicate_with_same_chunks():
+    cache = SemanticCache(max_entries=4, threshold=0.9)
+    cache.store(vec(1, 0, 0), KEY, CHUNKS, "120 houses")
+
+    assert cache.lookup(vec(1, 0.1, 0), KEY, CHUNKS) == "120 houses"
+    assert cache.stats()["hits"] == 1
+
+
+def test_miss_on_low_similarity_or_different_key_or_chunks():
+    cache = SemanticCache(max_entries=4, threshold=0.9)
+    cache.store(vec(1, 0, 0), KEY, CHUNKS, "120 houses")
+
+    assert cache.lookup(vec(0, 1, 0), KEY, CHUNKS) is None
+    assert cache.lookup(vec(1, 0, 0), (("MH08AP1895",), ()), CHUNKS) is None
+    assert cache.lookup(vec(1, 0, 0), KEY, [(None, 0), (None, 4)]) is None
+    stats = cache.stats()
+    assert stats["misses"] == 3
+    assert stats["hit_rate"] == 0.0
+
+
+def test_skipped_lookups_count_against_hit_rate():
+    cache = SemanticCache(max_entries=4, threshold=0.9)
+    cache.store(vec(1, 0, 0), KEY, CHUNKS, "120 houses")
+    assert cache.lookup(vec(1, 0, 0), KEY, CHUNKS) == "120 houses"
+    cache.skip()
+
+    stats = cache.stats()
+    assert stats["skipped"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_lru_eviction_bounds_size():
+    cache = SemanticCache(max_entries=2, threshold=0.9)
+    cache.store(vec(1, 0, 0), KEY, CHUNKS, "a")
+    cache.store(vec(0, 1, 0), KEY, CHUNKS, "b")
+    assert cache.lookup(vec(1, 0, 0), KEY, CHUNKS) == "a"  # a is now most recent
+    cache.store(vec(0, 0, 1), KEY, CHUNKS, "c")
+
+    assert len(cache) == 2
+    assert cache.stats()["evictions"] == 1
+    assert cache.lookup(vec(0, 1, 0), KEY, CHUNKS) is None
+    assert cache.lookup(vec(1, 0, 0), KEY, CHUNKS) == "a"
+
+
+def test_invalidate_by_tenant_and_all():
+    cache = SemanticCache(max_entries=4, threshold=0.9)
+    cache.store(vec(1, 0, 0), KEY, [("ulb_a", 0)], "a")
+    cache.store(vec(0, 1, 0), KEY, [("ulb_b", 0)], "b")
+
+    cache.invalidate("ulb_a")
+    assert cache.lookup(vec(1, 0, 0), KEY, [("ulb_a", 0)]) is None
+    assert cache.lookup(vec(0, 1, 0), KEY, [("ulb_b", 0)]) == "b"
+
+    cache.invalidate()
+    assert len(cache) == 0
+    assert cache.lookup(vec(0, 1, 0), KEY, [("ulb_b", 0)]) is None
@@ -0,0 +1,152 @@
+from session_store import SessionStore, valid_session_id
+
+
+def make_store(tmp_path):
+    return SessionStore(str(tmp_path / "sessions.sqlite3"))
+
+
+def fill(store, sid, n):
+    start = store.count_turns(sid)
+    for i in range(start, start + n):
+        store.append_turn(sid, f"q{i}", f"a{i}")
+
+
+def test_turns_persist_across_reopen(tmp_path):
+    store = make_store(tmp_path)
+    sid = store.new_session()
+    fill(store, sid, 2)
+
+    reopened = make_store(tmp_path)
+    assert reopened.context(sid) == ("", [("q0", "a0"), ("q1", "a1")])
+
+
+def test_paging_newest_first():
+    store = SessionStore(":memory:")
+    sid = store.new_session()
+    fill(store, sid, 25)
+
+    assert store.count_turns(sid) == 25
+    assert [seq for seq, _, _ in store.page(sid, 0, 10)] == list(range(15, 25))
+    assert [seq for seq, _, _ in store.page(sid, 2, 10)] == list(range(0, 5))
+    assert [seq for seq, _, _ in store.iter_turns(sid, batch_size=7)] == list(range(25))
+
+
+def test_summarize_folds_old_turns_incrementally():
+    store = SessionStore(":memory:")
+    sid = store.new_session()
+    calls = []
+
+    def summarizer(old, turns):
+        calls.append([u for u, _ in turns])
+        return (old + " " + ",".join(u for u, _ in turns)).strip()
+
+    fill(store, sid, 5)
+    assert store.summarize(sid, summarizer, keep_recent=3, min_batch=3) is False  # only 2 waiting
+
+    fill(store, sid, 2)  # 7 turns, 4 older than the last 3
+    assert store.summarize(sid, summarizer, keep_recent=3, min_batch=3) is True
+    assert store.context(sid)[0] == "q0,q1,q2,q3"
+
+    fill(store, sid, 3)
+    assert store.summarize(sid, summarizer, keep_recent=3, min_batch=3) is True
+    assert calls == [["q0", "q1", "q2", "q3"], ["q4", "q5", "q6"]]
+
+
+def test_summarize_caps_digest_and_batch():
+    store = SessionStore(":memory:")
+    sid = store.new_session()
+    fill(store, sid, 30)
+    seen = []
+
+    def summarizer(old, turns):
+        seen.append(len(turns))
+        return "x" * 1000
+
+    store.summarize(sid, summarizer, keep_recent=3, max_batch=10, char_limit=50)
+    assert seen == [10]
+    assert len(store.context(sid)[0]) == 50
+
+
+def test_clear_resets_and_discards_stale_summary():
+    store = SessionStore(":memory:")
+    sid = store.new_session()
+    fill(store, sid, 8)
+
+    def summarizer(old, turns):
+        store.clear(sid)  # chat cleared while the summary was being written
+        return "stale"
+
+    assert store.summarize(sid, summarizer, keep_recent=3) is False
+    assert store.context(sid)[0] == ""
+    assert store.count_turns(sid) == 0
+    assert store.append_turn(sid, "q", "a") == 8
+
+
+def test_context_covers_every_turn():
+    store = SessionStore(":memory:")
+    sid = store.new_session()
+    folded = []
+
+    def summarizer(old, turns):
+        folded.extend(u for u, _ in turns)
+        return ",".join(folded)
+
+    for n in range(1, 16):
+        fill(store, sid, 1)
+        if n % 4:  # some turns arrive while the previous summary is still running
+            store.summarize(sid, summarizer, keep_recent=3, min_batch=3)
+
+        digest, turns = store.context(sid)
+        in_digest = digest.split(",") if digest else []
+        assert in_digest + [u for u, _ in turns] == [f"q{i}" for i in range(n)]
+        assert len(turns) <= 3 + 3 - 1 + 1
+
+
+def test_context_is_capped_when_summaries_fail():
+    store = SessionStore(":memory:")
+    sid = store.new_session()
+
+    def summarizer(old, turns):
+        raise RuntimeError("ollama down")
+
+    for _ in range(20):
+        fill(store, sid, 1)
+        try:
+            store.summarize(sid, summarizer, keep_recent=3, max_batch=10)
+        except RuntimeError:
+            pass
+
+    digest, turns = store.context(sid, max_turns=13)
+    assert digest == ""
+    assert [u for u, _ in turns] == [f"q{i}" for i in range(7, 20)]
+
+
+def test_session_is_stored_with_first_turn(tmp_path):
+    store = make_store(tmp_path)
+    sid = store.new_session()
+    assert valid_session_id(sid)
+    assert not valid_session_id("../x")
+    assert store.context(sid) == ("", [])
+    assert store.count_turns(sid) == 0
+    assert store._query("SELECT COUNT(*) FROM sessions")[0][0] == 0
+
+    fill(store, sid, 1)
+    assert store._query("SELECT COUNT(*) FROM sessions")[0][0] == 1
+
+
+def test_expire_drops_idle_sessions():
+    store = SessionStore(":memory:")
+    idle, active = store.new_session(), store.new_session()
+    fill(store, idle, 3)
+    fill(store, active, 1)
+    day = 86400
+    store._query("UPDATE turns SET ts = ts - ? WHERE session_id = ?", (10 * day, idle))
+    store._query("UPDATE sessions SET created = created - ?", (10 * day,))
+
+    assert store.expire(7 * day) == 1
+    assert store.count_turns(idle) == 0
+    assert store._query("SELECT id FROM sessions") == [(active,)]
+    # throttled: a second sweep right away does nothing
+    store._query("UPDATE turns SET ts = ts - ?", (10 * day,))
+    assert store.expire(7 * day, every=3600) == 0
+    assert store.expire(7 * day) == 1